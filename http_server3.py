@@ -1,91 +1,426 @@
 import json
+import logging
 import datetime
-import uuid
+import time
 import os
 import re
-import math 
-import binascii
-from flask import Flask, request, jsonify, render_template, abort, url_for
-from urllib.parse import quote_plus 
-from collections import defaultdict
+import math
+import struct
+import threading
+import queue
+from flask import Flask, request, jsonify, render_template, abort, url_for, Response, stream_with_context
+from urllib.parse import quote_plus
+from collections import defaultdict, deque
+from functools import lru_cache
+
+# orjson 是可选依赖：C 实现的 JSON 编解码，比标准库快数倍；未安装时回退到标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# zstandard 也是可选依赖：安装后快照以 zstd 压缩落盘（体积约缩小 4-10 倍，
+# 解压常常比从磁盘读等量明文还快）；未安装时继续写明文 JSON 快照
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Flask-Compress 也是可选依赖：字段名高度重复的 JSON/HTML 响应 gzip 后
+# 通常只剩 10-20% 的字节数；未安装时响应保持明文
+try:
+    from flask_compress import Compress
+except ImportError:
+    Compress = None
+
+# 日志走标准 logging：asctime 由 Formatter 按记录生成（每条一次 clock 调用），
+# 不再在每个调用点手工构造 datetime.now() + f-string 前缀
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] %(message)s')
+logger = logging.getLogger('http_server3')
 
 app = Flask(__name__)
 
+if Compress is not None:
+    app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html']
+    app.config['COMPRESS_LEVEL'] = 6
+    app.config['COMPRESS_MIN_SIZE'] = 512
+    Compress(app)
+
+if orjson is not None:
+    from flask.json.provider import JSONProvider
+
+    class OrjsonProvider(JSONProvider):
+        """基于 orjson 的 Flask JSON provider，加速 jsonify 和 request.get_json()"""
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = OrjsonProvider(app)
+
 # --- 配置 ---
 DATA_FILE = 'data_store.json'
-DATA_STORE = {} # 存储原始的 message_entry: {raw_post_data, parsed_content, receive_time}
+ZST_FILE = DATA_FILE + '.zst'   # 压缩快照（仅在安装了 zstandard 时使用）
+WAL_FILE = 'data_store.jsonl'   # 追加写的 WAL 文件，每行一条消息
+WAL_OLD_FILE = WAL_FILE + '.old'   # 压缩期间轮转出的旧 WAL，快照写成功后删除
+COMPACT_INTERVAL_SECONDS = 30   # 后台压缩 WAL 到快照文件的周期
+# 每个 ID 最多保留的历史消息条数：deque(maxlen=...) 构成环形缓冲，appendleft
+# 自动淘汰最旧的消息，内存和页面渲染量都被限制在 O(ID数 × 上限) 以内
+MAX_HISTORY_PER_ID = 500
+
+def _new_history():
+    """新 ID 的历史队列工厂"""
+    return deque(maxlen=MAX_HISTORY_PER_ID)
+
+# IdNumber -> deque(message_entry)，message_entry: {raw_post_data, parsed_content, receive_time}
+# defaultdict 让写入路径省掉 membership 检查，一次哈希查找完成取或建
+DATA_STORE = defaultdict(_new_history)
+
+# 分片锁：按 ID 哈希选 16 路锁之一，写入只锁自己的分片，读取在分片锁内把
+# deque 快照成 list 后在锁外格式化。deque 在并发 appendleft 时迭代会抛
+# RuntimeError，快照消除该竞态，又不像一把全局锁那样串行化所有请求
+_SHARD_COUNT = 16
+_SHARD_LOCKS = [threading.RLock() for _ in range(_SHARD_COUNT)]
+
+def _shard_lock(id_number):
+    return _SHARD_LOCKS[hash(id_number) & (_SHARD_COUNT - 1)]
+
+def _history_snapshot(id_number):
+    """在对应分片锁内把指定 ID 的历史复制为 list，供锁外安全迭代"""
+    with _shard_lock(id_number):
+        return list(DATA_STORE.get(id_number, ()))
 
 # 高德地图JS API Key
 AMAP_JSAPI_KEY = '9374c8276711715a3e4a6b5180e8ca63'
 
 
 # --- 数据持久化辅助函数 ---
+
+# 接收时间：POST 路径只存 time.time_ns() 整数（省去 strftime/isoformat，排序是
+# 原生整数比较），展示时再懒格式化；旧数据里的 ISO 字符串继续兼容
+def _receive_time_sort_key(message_entry):
+    """排序键：统一换算为纳秒数，新旧两种 receive_time 格式均可比较"""
+    receive_time = message_entry.get('receive_time')
+    if isinstance(receive_time, (int, float)):
+        return receive_time
+    try:
+        return datetime.datetime.fromisoformat(receive_time).timestamp() * 1e9
+    except (TypeError, ValueError):
+        return 0.0
+
+def _format_receive_time(receive_time):
+    """把存储的接收时间格式化为展示用字符串"""
+    if isinstance(receive_time, (int, float)):
+        return datetime.datetime.fromtimestamp(receive_time / 1e9).isoformat(timespec='seconds')
+    return receive_time if receive_time else 'N/A'
+
+def _read_snapshot_bytes():
+    """读取快照的原始 JSON 字节：优先压缩快照，其次明文；都不存在时返回 (None, None)"""
+    if os.path.exists(ZST_FILE):
+        if zstandard is not None:
+            # stream_reader 兼容无内容长度头的流式压缩帧
+            with open(ZST_FILE, 'rb') as f:
+                return zstandard.ZstdDecompressor().stream_reader(f).read(), ZST_FILE
+        logger.warning(f"存在压缩快照 {ZST_FILE} 但未安装 zstandard，无法读取。")
+    if os.path.exists(DATA_FILE):
+        with open(DATA_FILE, 'rb') as f:
+            return f.read(), DATA_FILE
+    return None, None
+
 def load_data():
     """从文件中加载数据到 DATA_STORE"""
     global DATA_STORE
-    print(f"[{datetime.datetime.now()}] [INFO] 尝试从 {DATA_FILE} 加载数据...")
-    if os.path.exists(DATA_FILE):
+    logger.info("尝试加载快照数据...")
+    raw_bytes, source_file = None, None
+    try:
+        raw_bytes, source_file = _read_snapshot_bytes()
+    except Exception as e:
+        logger.error(f"读取快照文件时发生错误: {e}，将初始化为空数据存储。")
+    if raw_bytes is not None:
         try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                loaded_data = json.load(f)
-                if not isinstance(loaded_data, dict):
-                    raise ValueError("加载的数据不是字典格式。")
-                DATA_STORE = loaded_data
+            loaded_data = orjson.loads(raw_bytes) if orjson is not None else json.loads(raw_bytes)
+            if not isinstance(loaded_data, dict):
+                raise ValueError("加载的数据不是字典格式。")
+            DATA_STORE = defaultdict(_new_history, loaded_data)
             
             for id_num, messages in DATA_STORE.items():
                 if not isinstance(messages, list):
-                    print(f"[{datetime.datetime.now()}] [WARN] ID '{id_num}' 下的数据不是列表，将跳过或重置。")
-                    DATA_STORE[id_num] = []
+                    logger.warning(f"ID '{id_num}' 下的数据不是列表，将跳过或重置。")
+                    DATA_STORE[id_num] = _new_history()
                     continue
-                # 确保消息按接收时间倒序排列
-                DATA_STORE[id_num] = sorted(
-                    messages, 
-                    key=lambda x: datetime.datetime.fromisoformat(x.get('receive_time', '1970-01-01T00:00:00')), 
-                    reverse=True
-                )
-            print(f"[{datetime.datetime.now()}] [INFO] 数据从 {DATA_FILE} 加载成功，包含 {len(DATA_STORE)} 个ID。")
+                # 确保消息按接收时间倒序排列；正常写出的快照本身就是倒序的，
+                # 先做一次线性单调性检查，只有（手工编辑等导致的）乱序才真正排序
+                sort_keys = [_receive_time_sort_key(m) for m in messages]
+                if any(a < b for a, b in zip(sort_keys, sort_keys[1:])):
+                    messages = sorted(messages, key=_receive_time_sort_key, reverse=True)
+                # deque 的 appendleft 是 C 实现的 O(1)，比 list.insert(0, ...)
+                # 的整体搬移快，且在 GIL 下对并发写安全
+                # 截取最新的 MAX_HISTORY_PER_ID 条（列表是新在前的）
+                DATA_STORE[id_num] = deque(messages[:MAX_HISTORY_PER_ID], maxlen=MAX_HISTORY_PER_ID)
+            logger.info(f"数据从 {source_file} 加载成功，包含 {len(DATA_STORE)} 个ID。")
         except json.JSONDecodeError:
-            print(f"[{datetime.datetime.now()}] [ERROR] {DATA_FILE} 不是有效的 JSON 文件，将初始化为空数据存储。")
-            DATA_STORE = {}
+            logger.error(f"{source_file} 不是有效的 JSON 文件，将初始化为空数据存储。")
+            DATA_STORE = defaultdict(_new_history)
         except ValueError as ve:
-            print(f"[{datetime.datetime.now()}] [ERROR] 加载数据时发生值错误: {ve}，将初始化为空数据存储。")
-            DATA_STORE = {}
+            logger.error(f"加载数据时发生值错误: {ve}，将初始化为空数据存储。")
+            DATA_STORE = defaultdict(_new_history)
         except Exception as e:
-            print(f"[{datetime.datetime.now()}] [ERROR] 加载数据时发生未知错误: {e}，将初始化为空数据存储。")
-            DATA_STORE = {}
+            logger.error(f"加载数据时发生未知错误: {e}，将初始化为空数据存储。")
+            DATA_STORE = defaultdict(_new_history)
     else:
-        print(f"[{datetime.datetime.now()}] [INFO] 数据文件 {DATA_FILE} 不存在，将初始化为空数据存储。")
-        DATA_STORE = {}
+        logger.info("快照文件不存在，将初始化为空数据存储。")
+        DATA_STORE = defaultdict(_new_history)
+
+def _persistable(message_entry):
+    """条目的持久化视图：剔除以 '_' 开头的运行期缓存字段（如 _formatted）"""
+    return {k: v for k, v in message_entry.items() if not k.startswith('_')}
+
+def _write_snapshot_json(sink):
+    """把 DATA_STORE 以紧凑 JSON 逐 ID 流式写入 sink。
+
+    每个 ID 的历史在分片锁内快照、序列化后立刻写出，峰值内存只有单个 ID
+    的数据量，而不是整个快照的一份大字节串。
+    """
+    sink.write(b'{')
+    first = True
+    for id_num in list(DATA_STORE.keys()):
+        # deque 不能直接被 JSON 序列化，落盘前转换为普通列表
+        messages = [_persistable(m) for m in _history_snapshot(id_num)]
+        if orjson is not None:
+            key_bytes = orjson.dumps(id_num)
+            val_bytes = orjson.dumps(messages)
+        else:
+            key_bytes = json.dumps(id_num, ensure_ascii=False).encode('utf-8')
+            val_bytes = json.dumps(messages, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if not first:
+            sink.write(b',')
+        sink.write(key_bytes)
+        sink.write(b':')
+        sink.write(val_bytes)
+        first = False
+    sink.write(b'}')
 
 def save_data():
-    """将 DATA_STORE 中的数据保存到文件"""
+    """将 DATA_STORE 中的数据保存到快照文件（先写临时文件，再原子替换）"""
     try:
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(DATA_STORE, f, indent=2, ensure_ascii=False)
+        target_file = ZST_FILE if zstandard is not None else DATA_FILE
+        tmp_file = target_file + '.tmp'
+        with open(tmp_file, 'wb', buffering=1 << 20) as f:
+            if zstandard is not None:
+                with zstandard.ZstdCompressor(level=3).stream_writer(f, closefd=False) as sink:
+                    _write_snapshot_json(sink)
+            else:
+                _write_snapshot_json(f)
+        # os.replace 保证崩溃时要么是旧快照要么是新快照，不会出现半个文件
+        os.replace(tmp_file, target_file)
+        # 压缩快照写成功后清理旧的明文快照，避免留下一份会过期的副本
+        if target_file == ZST_FILE and os.path.exists(DATA_FILE):
+            os.remove(DATA_FILE)
+        return True
     except Exception as e:
-        print(f"[{datetime.datetime.now()}] [ERROR] 保存数据到 {DATA_FILE} 时发生错误: {e}")
+        logger.error(f"保存数据快照时发生错误: {e}")
+        return False
+
+# WAL 追加写句柄，由 init_persistence() 在回放完成后打开
+_wal_file = None
+_wal_lock = threading.Lock()   # 保护 _wal_file 的写入与压缩清空
+
+# WAL 组提交：请求线程把记录放进队列并等待，后台写线程把一批记录一次性写入
+# 并做一次 fsync，再统一唤醒等待者 —— N 个并发请求分摊一次 fsync 的开销
+_WAL_BATCH_MAX = 128
+# 有界队列：写线程追不上时入队阻塞，对上游形成背压而不是无限堆积内存
+_wal_queue = queue.Queue(maxsize=1024)
+
+# SYNC_EVERY_WRITE=0 时放弃每批 fsync，只 flush 到 OS 缓冲区，由操作系统决定
+# 落盘时机 —— 吞吐更高，但掉电可能丢最后几秒的数据；默认保持每批 fsync
+_WAL_FSYNC = os.environ.get('SYNC_EVERY_WRITE', '1') != '0'
+
+def append_wal(id_number, message_entry):
+    """把单条消息交给组提交线程落盘。
+
+    默认（fsync 开启）等待所在批次落盘后才返回，保证应答即持久；
+    SYNC_EVERY_WRITE=0 时本来就不保证落盘，请求线程只做一次入队即返回，
+    磁盘写完全移出请求路径。
+    """
+    if _WAL_FSYNC:
+        done = threading.Event()
+        _wal_queue.put((done, id_number, message_entry))
+        done.wait()
+    else:
+        _wal_queue.put((None, id_number, message_entry))
+
+def _wal_writer_loop():
+    """后台写线程：阻塞取第一条，顺带取走队列里已有的记录，批量写入并 fsync"""
+    while True:
+        batch = [_wal_queue.get()]
+        while len(batch) < _WAL_BATCH_MAX:
+            try:
+                batch.append(_wal_queue.get_nowait())
+            except queue.Empty:
+                break
+        wal_entries = [{'id': id_number, 'record': _persistable(m)} for _, id_number, m in batch]
+        if orjson is not None:
+            lines = [orjson.dumps(wal_entry).decode() for wal_entry in wal_entries]
+        else:
+            lines = [json.dumps(wal_entry, ensure_ascii=False) for wal_entry in wal_entries]
+        try:
+            with _wal_lock:
+                _wal_file.write('\n'.join(lines) + '\n')
+                _wal_file.flush()
+                if _WAL_FSYNC:
+                    os.fsync(_wal_file.fileno())
+        except Exception as e:
+            logger.error(f"批量写入 WAL 文件 {WAL_FILE} 时发生错误: {e}")
+        for done, _, _ in batch:
+            if done is not None:
+                done.set()
+
+def replay_wal():
+    """启动时回放 WAL 文件，把快照之后的增量消息合并进 DATA_STORE。
+
+    先回放上次压缩轮转出的旧 WAL（崩溃可能导致它未被删除），再回放活跃
+    WAL。轮转设计下 WAL 记录可能与快照内容有少量重叠，按接收时间比对后
+    跳过完全相同的记录，避免重启后出现重复消息。
+    """
+    replayed = 0
+    for wal_path in (WAL_OLD_FILE, WAL_FILE):
+        if not os.path.exists(wal_path):
+            continue
+        try:
+            with open(wal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        wal_entry = orjson.loads(line) if orjson is not None else json.loads(line)
+                        id_number = wal_entry['id']
+                        message_entry = wal_entry['record']
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning(f"{wal_path} 中存在无法解析的行，已跳过。")
+                        continue
+                    history = DATA_STORE[id_number]
+                    sort_key = _receive_time_sort_key(message_entry)
+                    if any(m == message_entry for m in history
+                           if _receive_time_sort_key(m) == sort_key):
+                        continue
+                    history.appendleft(message_entry)
+                    replayed += 1
+        except Exception as e:
+            logger.error(f"回放 WAL 文件 {wal_path} 时发生错误: {e}")
+    if replayed:
+        logger.info(f"从 WAL 回放了 {replayed} 条消息。")
+
+def _remove_old_wal():
+    """删除轮转出的旧 WAL 文件（内容已确认写入快照后才可调用）"""
+    try:
+        os.remove(WAL_OLD_FILE)
+    except OSError as e:
+        logger.error(f"删除旧 WAL 文件 {WAL_OLD_FILE} 时发生错误: {e}")
+
+def compact_data():
+    """把 DATA_STORE 写入快照文件，并轮转清理已落盘的 WAL。
+
+    先在锁内把当前 WAL 轮转出去、换上新的活跃句柄，再写快照：快照期间
+    落盘的新写入进入活跃 WAL，不会被随后的清理删掉；被轮转出去的旧 WAL
+    内容此刻必然已在内存中，会被这次快照完整覆盖。（直接 truncate 会把
+    快照序列化期间新到的、已应答的写入一并抹掉。）快照写失败时保留旧
+    WAL，下次启动仍可回放。
+    """
+    global _wal_file
+    try:
+        with _wal_lock:
+            os.replace(WAL_FILE, WAL_OLD_FILE)
+            old_handle = _wal_file
+            _wal_file = open(WAL_FILE, 'a', buffering=1 << 16, encoding='utf-8')
+            old_handle.close()
+    except Exception as e:
+        logger.error(f"轮转 WAL 文件 {WAL_FILE} 时发生错误: {e}")
+        return
+    if save_data():
+        _remove_old_wal()
+
+def _compaction_loop():
+    """后台线程：周期性地把 WAL 压缩到快照文件"""
+    while True:
+        threading.Event().wait(COMPACT_INTERVAL_SECONDS)
+        compact_data()
+
+def init_persistence():
+    """加载快照、回放 WAL、打开追加写句柄并启动后台压缩线程"""
+    global _wal_file
+    load_data()
+    replay_wal()
+    _wal_file = open(WAL_FILE, 'a', buffering=1 << 16, encoding='utf-8')
+    # 上次压缩若在快照写完前崩溃会留下轮转出的旧 WAL；回放已把它合并进
+    # 内存，重写一次快照成功后即可删除（与活跃 WAL 的重叠由回放去重兜底）
+    if os.path.exists(WAL_OLD_FILE) and save_data():
+        _remove_old_wal()
+    threading.Thread(target=_wal_writer_loop, daemon=True).start()
+    threading.Thread(target=_compaction_loop, daemon=True).start()
 
 # --- 电文解析辅助函数 ---
+
+# 固定 39 字节定位数据区的布局: 定位时间(8) 纬度半球(1) 纬度(10) 经度半球(1) 经度(11) 高程(8)
+# struct.unpack 在 C 层一次性切出全部字段，省去逐字段的 Python 级切片
+_FIXED_HEADER = struct.Struct('8s1s10s1s11s8s')
+
 def parse_hex_content(hex_str):
     """
     解析十六进制电文内容，返回解析后的字典。
     """
     parsed_data = {"raw_hex_content": hex_str}
-    
-    if not isinstance(hex_str, str) or not re.fullmatch(r'^[0-9a-fA-F]*$', hex_str):
+
+    # 不再用正则预检字符集：bytes.fromhex 在 C 层解码时就地校验，一遍完成。
+    # isalnum 挡住空白/标点（fromhex 会宽容地跳过空白），保持原有的严格语义
+    if not isinstance(hex_str, str) or (hex_str and not hex_str.isalnum()):
         parsed_data['parse_status_text'] = "十六进制字符串格式错误"
         parsed_data['parse_status_class'] = "error-text"
         parsed_data['parse_error_detail'] = "输入不是有效的十六进制字符串。"
         return parsed_data
 
     try:
-        byte_data = binascii.unhexlify(hex_str)
-    except binascii.Error as e:
+        # bytes.fromhex 与 unhexlify 等价，但在 CPython 里走更快的实现
+        byte_data = bytes.fromhex(hex_str)
+    except ValueError as e:
         parsed_data['parse_status_text'] = f"十六进制解码错误"
         parsed_data['parse_status_class'] = "error-text"
         parsed_data['parse_error_detail'] = f"十六进制字符串解码失败: {e}"
         return parsed_data
 
+    return parse_payload(byte_data, raw_hex=hex_str)
+
+def _decode_custom_data(custom_bytes):
+    """解码自定义数据段，常见路径零异常、一次解码完成。
+
+    纯 ASCII 走 C 快路径；否则先试严格 UTF-8（新设备），失败再退回 GBK
+    （errors='replace'，旧设备）。GBK 兼容 ASCII，所以混合的中英文内容
+    一次整段解码即可，不再逐字符试错。
+    """
+    if custom_bytes.isascii():
+        return custom_bytes.decode('ascii')
+    try:
+        return custom_bytes.decode('utf-8')
+    except UnicodeDecodeError:
+        return custom_bytes.decode('gbk', errors='replace')
+
+@lru_cache(maxsize=1024)
+def _parse_hex_cached(hex_str):
+    """parse_hex_content 的 LRU 缓存版本：设备静止时经常重复上报完全相同的电文，
+    命中时解析退化为一次字典查找。调用方需 dict() 复制返回值，避免改动缓存项"""
+    return parse_hex_content(hex_str)
+
+def parse_payload(byte_data, raw_hex=None):
+    """
+    解析原始字节电文，返回解析后的字典。
+    二进制接收路径直接传入 bytes，跳过十六进制字符串到 bytes 的转换。
+    """
+    if raw_hex is None:
+        raw_hex = byte_data.hex().upper()
+    parsed_data = {"raw_hex_content": raw_hex}
+    warnings = []   # 各步骤的警告先收集到列表，最后一次 join，避免反复字符串拼接
+
     offset = 0
     total_len = len(byte_data)
 
@@ -98,133 +433,52 @@ def parse_hex_content(hex_str):
     data_id = byte_data[offset]
     parsed_data['数据标识'] = f"0x{data_id:02X}"
     if data_id != 0xA4:
-        parsed_data['parse_warning_detail'] = parsed_data.get('parse_warning_detail', '') + " 数据标识不是 0xA4。"
-    offset += 1
-
-    # 2. 定位时间 (8 bytes): hh:mm:ss
-    if total_len < offset + 8:
-        parsed_data['parse_status_text'] = "解析错误"
-        parsed_data['parse_status_class'] = "error-text"
-        parsed_data['parse_error_detail'] = "数据长度不足，无法解析定位时间。"
-        return parsed_data
-    try:
-        parsed_data['定位时间'] = byte_data[offset : offset + 8].decode('ascii')
-    except UnicodeDecodeError:
-        parsed_data['定位时间'] = f"<{binascii.hexlify(byte_data[offset : offset + 8]).decode()}> (解码失败)"
-        parsed_data['parse_warning_detail'] = parsed_data.get('parse_warning_detail', '') + " 定位时间解码为 ASCII 失败。"
-    offset += 8
-
-    # 3. 纬度半球 (1 byte): N/S
-    if total_len < offset + 1:
-        parsed_data['parse_status_text'] = "解析错误"
-        parsed_data['parse_status_class'] = "error-text"
-        parsed_data['parse_error_detail'] = "数据长度不足，无法解析纬度半球。"
-        return parsed_data
-    try:
-        parsed_data['纬度半球'] = byte_data[offset : offset + 1].decode('ascii')
-    except UnicodeDecodeError:
-        parsed_data['纬度半球'] = f"<{binascii.hexlify(byte_data[offset : offset + 1]).decode()}> (解码失败)"
-        parsed_data['parse_warning_detail'] = parsed_data.get('parse_warning_detail', '') + " 纬度半球解码为 ASCII 失败。"
-    offset += 1
-
-    # 4. 纬度 (10 bytes): ddmm.mmmmm
-    if total_len < offset + 10:
-        parsed_data['parse_status_text'] = "解析错误"
-        parsed_data['parse_status_class'] = "error-text"
-        parsed_data['parse_error_detail'] = "数据长度不足，无法解析纬度。"
-        return parsed_data
-    try:
-        parsed_data['原始纬度值'] = byte_data[offset : offset + 10].decode('ascii')
-    except UnicodeDecodeError:
-        parsed_data['原始纬度值'] = f"<{binascii.hexlify(byte_data[offset : offset + 10]).decode()}> (解码失败)"
-        parsed_data['parse_warning_detail'] = parsed_data.get('parse_warning_detail', '') + " 原始纬度值解码为 ASCII 失败。"
-    offset += 10
-
-    # 5. 经度半球 (1 byte): E/W
-    if total_len < offset + 1:
-        parsed_data['parse_status_text'] = "解析错误"
-        parsed_data['parse_status_class'] = "error-text"
-        parsed_data['parse_error_detail'] = "数据长度不足，无法解析经度半球。"
-        return parsed_data
-    try:
-        parsed_data['经度半球'] = byte_data[offset : offset + 1].decode('ascii')
-    except UnicodeDecodeError:
-        parsed_data['经度半球'] = f"<{binascii.hexlify(byte_data[offset : offset + 1]).decode()}> (解码失败)"
-        parsed_data['parse_warning_detail'] = parsed_data.get('parse_warning_detail', '') + " 经度半球解码为 ASCII 失败。"
+        warnings.append("数据标识不是 0xA4。")
     offset += 1
 
-    # 6. 经度 (11 bytes): dddmm.mmmmm
-    if total_len < offset + 11:
-        parsed_data['parse_status_text'] = "解析错误"
-        parsed_data['parse_status_class'] = "error-text"
-        parsed_data['parse_error_detail'] = "数据长度不足，无法解析经度。"
-        return parsed_data
-    try:
-        parsed_data['原始经度值'] = byte_data[offset : offset + 11].decode('ascii')
-    except UnicodeDecodeError:
-        parsed_data['原始经度值'] = f"<{binascii.hexlify(byte_data[offset : offset + 11]).decode()}> (解码失败)"
-        parsed_data['parse_warning_detail'] = parsed_data.get('parse_warning_detail', '') + " 原始经度值解码为 ASCII 失败。"
-    offset += 11
-
-    # 7. 高程 (8 bytes): ±xxxxx.x
-    if total_len < offset + 8:
-        parsed_data['parse_status_text'] = "解析错误"
-        parsed_data['parse_status_class'] = "error-text"
-        parsed_data['parse_error_detail'] = "数据长度不足，无法解析高程。"
-        return parsed_data
-    try:
-        parsed_data['高程'] = byte_data[offset : offset + 8].decode('ascii')
-    except UnicodeDecodeError:
-        parsed_data['高程'] = f"<{binascii.hexlify(byte_data[offset : offset + 8]).decode()}> (解码失败)"
-        parsed_data['parse_warning_detail'] = parsed_data.get('parse_warning_detail', '') + " 高程解码为 ASCII 失败。"
-    offset += 8
-
-    # 8. 隔离符 (1 byte): '-' (0x2D)
-    if total_len < offset + 1:
+    # 2-8. 定位时间/纬度/经度/高程 (39 bytes 纯 ASCII) + 隔离符 (1 byte)
+    # 固定区域整体只做一次 ASCII 解码，避免逐字段 decode；GBK 只用于后面的自定义数据段
+    if total_len < offset + 40:
         parsed_data['parse_status_text'] = "解析错误"
         parsed_data['parse_status_class'] = "error-text"
-        parsed_data['parse_error_detail'] = "数据长度不足，无法解析隔离符。"
+        parsed_data['parse_error_detail'] = "数据长度不足，无法解析 40 字节定位数据区。"
         return parsed_data
-    separator = byte_data[offset]
+    region = byte_data[offset : offset + 39]
+    if region.isascii():
+        # 快路径：整个定位数据区一次解码（纯 ASCII 走 C 快路径），再按固定偏移切子串
+        text = region.decode('ascii')
+        loc_time, lat_hemi, lat_val, lon_hemi, lon_val, alt = (
+            text[0:8], text[8:9], text[9:19], text[19:20], text[20:31], text[31:39]
+        )
+    else:
+        warnings.append("定位数据区包含非 ASCII 字节。")
+        loc_time, lat_hemi, lat_val, lon_hemi, lon_val, alt = (
+            b.decode('ascii', errors='replace') for b in _FIXED_HEADER.unpack_from(byte_data, offset)
+        )
+    parsed_data['定位时间'] = loc_time    # hh:mm:ss
+    parsed_data['纬度半球'] = lat_hemi    # N/S
+    parsed_data['原始纬度值'] = lat_val   # ddmm.mmmmm
+    parsed_data['经度半球'] = lon_hemi    # E/W
+    parsed_data['原始经度值'] = lon_val   # dddmm.mmmmm
+    parsed_data['高程'] = alt             # ±xxxxx.x
+
+    separator = byte_data[offset + 39]               # '-' (0x2D)
     parsed_data['隔离符'] = f"0x{separator:02X}"
     if separator != 0x2D:
-        parsed_data['parse_warning_detail'] = parsed_data.get('parse_warning_detail', '') + " 隔离符不是 '-' (0x2D)。"
-    offset += 1
+        warnings.append("隔离符不是 '-' (0x2D)。")
+    offset += 40
+
+    # 9. 自定义数据 (剩余字节) - 一次性嗅探编码后整段解码
+    parsed_data['自定义数据'] = _decode_custom_data(byte_data[offset:])
 
-    # 9. 自定义数据 (剩余字节) - 混合 GBK / ASCII 解析
-    remaining_bytes = byte_data[offset:]
-    custom_data_decoded_parts = []
-    i = 0
-    
-    while i < len(remaining_bytes):
-        # 尝试解析 GBK (2字节)
-        if i + 1 < len(remaining_bytes):
-            try:
-                char_gbk = remaining_bytes[i : i + 2].decode('gbk')
-                custom_data_decoded_parts.append(char_gbk)
-                i += 2
-                continue
-            except UnicodeDecodeError:
-                pass # 不是有效的 GBK 字符对，尝试作为 ASCII
-        
-        # 尝试解析 ASCII (1字节)
-        try:
-            char_ascii = remaining_bytes[i : i + 1].decode('ascii')
-            custom_data_decoded_parts.append(char_ascii)
-            i += 1
-        except UnicodeDecodeError:
-            # 既不是 GBK 也不是 ASCII，可能是数据损坏，用十六进制表示
-            custom_data_decoded_parts.append(f"<{remaining_bytes[i : i + 1].hex()}>")
-            i += 1
-
-    parsed_data['自定义数据'] = ''.join(custom_data_decoded_parts)
-    
     # 最终确定解析状态
+    if warnings:
+        parsed_data['parse_warning_detail'] = ' '.join(warnings)
     if 'parse_error_detail' in parsed_data:
         parsed_data['parse_status_text'] = parsed_data.get('parse_status_text', '解析错误')
         parsed_data['parse_status_class'] = "error-text"
-    elif 'parse_warning_detail' in parsed_data:
-        parsed_data['parse_status_text'] = f"解析警告: {parsed_data['parse_warning_detail'].strip()}"
+    elif warnings:
+        parsed_data['parse_status_text'] = f"解析警告: {parsed_data['parse_warning_detail']}"
         parsed_data['parse_status_class'] = "error-text"
     else:
         parsed_data['parse_status_text'] = "解析成功"
@@ -232,33 +486,46 @@ def parse_hex_content(hex_str):
 
     return parsed_data
 
+# 坐标/高程格式校验的正则，模块级预编译一次，省去每次调用的缓存查找
+_COORD_NUM_RE = re.compile(r'^[0-9.]+$')
+_COORD_DDMM_RE = re.compile(r'^(\d{2})(\d{2}\.\d{5})$')
+_COORD_DDDMM_RE = re.compile(r'^(\d{3})(\d{2}\.\d{5})$')
+_ALT_RE = re.compile(r'^[+-]?[0-9]{1,5}\.[0-9]$')
+_REQ_ID_RE = re.compile(r'[0-9A-Za-z-]+')
+
 def convert_dmm_to_decimal(dmm_str, hemisphere):
     """
     将 ddmm.mmmmm 或 dddmm.mmmmm 格式转换为十进制。
+
+    纯算术实现：按小数点位置切出度和分，不做正则匹配和字符串拼接。
     """
-    if not isinstance(dmm_str, str) or not re.match(r'^\d+\.\d+$', dmm_str):
+    # replace+isdigit 等价于原来的 ^\d+\.\d+$ 校验，但全程在 C 层完成
+    if not isinstance(dmm_str, str) or not dmm_str.replace('.', '', 1).isdigit():
+        return None
+    dot = dmm_str.find('.')
+    # 小数点在第 4/5 位分别对应 ddmm.mmmmm / dddmm.mmmmm，且分数部分不能为空
+    if dot not in (4, 5) or dot == len(dmm_str) - 1:
         return None
     try:
-        parts = dmm_str.split('.')
-        
-        # 根据字符串长度判断是 ddmm 还是 dddmm
-        if len(parts[0]) == 4: # ddmm.mmmmm
-            degrees = int(parts[0][:2])
-            minutes = float(parts[0][2:] + '.' + parts[1])
-        elif len(parts[0]) == 5: # dddmm.mmmmm
-            degrees = int(parts[0][:3])
-            minutes = float(parts[0][3:] + '.' + parts[1])
-        else:
-            return None # 格式不匹配
-        
+        # 小数点前两位起是分，前面的是度
+        degrees = int(dmm_str[:dot - 2])
+        minutes = float(dmm_str[dot - 2:])
         decimal_deg = degrees + minutes / 60
-        
-        if hemisphere in ['S', 'W']:
+
+        if hemisphere in ('S', 'W'):
             decimal_deg = -decimal_deg
         return round(decimal_deg, 6) # 保留6位小数
     except Exception:
         return None
 
+# 半球字母 -> 中文前缀；模块级常量，大小写都收录，查表前无需 .upper()
+_HEMI_MAP = {
+    'N': '北纬', 'S': '南纬',
+    'E': '东经', 'W': '西经',
+    'n': '北纬', 's': '南纬',
+    'e': '东经', 'w': '西经'
+}
+
 def format_coords(hemisphere, value_str):
     """
     格式化经纬度，并处理无效值。
@@ -269,15 +536,15 @@ def format_coords(hemisphere, value_str):
     if not isinstance(value_str, str) or not value_str.strip():
         value_str = ''
 
-    if not re.match(r'^[0-9.]+$', value_str):
+    if not _COORD_NUM_RE.match(value_str):
         # 如果原始格式不是数字，或者包含其他字符，直接显示原始值并加括号
         return f"{hemisphere}{value_str} (格式错误或缺失)"
 
     try:
         # 兼容 ddmm.mmmmm 和 dddmm.mmmmm 两种格式
         # 尝试匹配 ddmm.mmmmm 或 dddmm.mmmmm
-        match_ddmm = re.match(r'^(\d{2})(\d{2}\.\d{5})$', value_str)
-        match_dddmm = re.match(r'^(\d{3})(\d{2}\.\d{5})$', value_str)
+        match_ddmm = _COORD_DDMM_RE.match(value_str)
+        match_dddmm = _COORD_DDDMM_RE.match(value_str)
 
         degree_str = ''
         minute_str = ''
@@ -292,11 +559,7 @@ def format_coords(hemisphere, value_str):
             # 如果不匹配标准格式，直接显示原始值，避免不必要的报错
             return f"{hemisphere}{value_str} (格式不符)"
 
-        hemi_map = {
-            'N': '北纬', 'S': '南纬',
-            'E': '东经', 'W': '西经'
-        }
-        hemi_full = hemi_map.get(hemisphere.upper(), hemisphere)
+        hemi_full = _HEMI_MAP.get(hemisphere, hemisphere)
 
         return f"{hemi_full}{degree_str}°{minute_str}'"
     except Exception as e:
@@ -310,7 +573,7 @@ def format_altitude(alt_str):
     if not isinstance(alt_str, str) or not alt_str.strip():
         return "N/A" # 或者直接返回空字符串，取决于前端需求
 
-    if not re.match(r'^[+-]?[0-9]{1,5}\.[0-9]$', alt_str):
+    if not _ALT_RE.match(alt_str):
         return f"{alt_str} (格式错误或缺失)"
     try:
         value = float(alt_str)
@@ -322,7 +585,32 @@ def format_altitude(alt_str):
         return f"{alt_str} (解析失败: {e})"
 
 
-def format_parsed_data_for_display(parsed_data, raw_post_data, receive_time):
+def _raw_post_json(obj):
+    """紧凑 JSON 字符串；缩进留给浏览器端 JSON.stringify 重新生成"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def get_formatted_message(msg_entry):
+    """取消息条目的展示格式化结果。
+
+    条目入库后不可变，所以首次访问时计算一次并缓存在条目自身的 _formatted
+    字段上（持久化时会被剔除），后续页面加载直接复用。
+    """
+    formatted = msg_entry.get('_formatted')
+    if formatted is None:
+        formatted = format_parsed_data_for_display(
+            msg_entry.get('parsed_content', {}),
+            msg_entry.get('raw_post_data', {}),
+            msg_entry.get('receive_time', None),
+            msg_entry.get('raw_post_pretty')
+        )
+        msg_entry['_formatted'] = formatted
+    return formatted
+
+
+def format_parsed_data_for_display(parsed_data, raw_post_data, receive_time, raw_post_pretty=None):
     """
     将解析后的数据格式化为更友好的显示格式。
     此函数现在直接返回一个扁平化的字典，包含所有用于显示和搜索的字段。
@@ -334,7 +622,7 @@ def format_parsed_data_for_display(parsed_data, raw_post_data, receive_time):
     formatted['MessageId'] = raw_post_data.get('MessageId', 'N/A')
     formatted['DeliveryCount'] = raw_post_data.get('DeliveryCount', 'N/A')
     formatted['NetworkMode'] = raw_post_data.get('NetworkMode', 'N/A')
-    formatted['接收时间'] = receive_time if receive_time else 'N/A'
+    formatted['接收时间'] = _format_receive_time(receive_time)
     
     formatted['解析状态'] = {
         'text': parsed_data.get('parse_status_text', '未知状态'),
@@ -365,65 +653,196 @@ def format_parsed_data_for_display(parsed_data, raw_post_data, receive_time):
 
     formatted['高程'] = format_altitude(parsed_data.get('高程', 'N/A')) # 格式化后的高程
 
-    # 添加原始POST数据，方便前端搜索和调试
-    formatted['raw_post_data_json'] = json.dumps(raw_post_data, indent=2, ensure_ascii=False)
+    # 添加原始POST数据，方便前端搜索和调试；新数据在 POST 时已预先序列化，
+    # 旧数据（无 raw_post_pretty 字段）在渲染时兜底序列化一次
+    if raw_post_pretty is None:
+        raw_post_pretty = _raw_post_json(raw_post_data)
+    formatted['raw_post_data_json'] = raw_post_pretty
 
     return formatted
 
 # --- API 路由 ---
+
+# POST 必填字段，frozenset 便于用一次集合差集找出全部缺失字段
+_REQUIRED_FIELDS = frozenset(('IdNumber', 'Content', 'Time', 'MessageId', 'DeliveryCount', 'NetworkMode'))
+
+def _fast_uuid():
+    """生成 uuid4 格式的请求 ID，绕过 UUID 对象构造，os.urandom + hex 全程在 C 层"""
+    h = os.urandom(16).hex()
+    return f'{h[0:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:32]}'
+
+# 固定形状 400 错误的预序列化响应模板：错误路径绕开 jsonify 和 JSON provider，
+# 只剩一次 % 替换和响应对象构造
+_ERR_NOT_JSON_CODE = "error: Content-Type must be application/json"
+_ERR_BAD_PAYLOAD_CODE = "error: Invalid JSON payload"
+_ERR_NOT_JSON_TPL = f'{{"RequestId":"%s","Code":"{_ERR_NOT_JSON_CODE}"}}'.encode()
+_ERR_BAD_PAYLOAD_TPL = f'{{"RequestId":"%s","Code":"{_ERR_BAD_PAYLOAD_CODE}"}}'.encode()
+
+def _prebuilt_error(template, code_text, req_id):
+    """用预序列化模板返回 400 JSON 错误响应；RequestId 含需转义字符时回退 jsonify"""
+    if _REQ_ID_RE.fullmatch(req_id):
+        return Response(template % req_id.encode('ascii'), status=400, mimetype='application/json')
+    return jsonify({"RequestId": req_id, "Code": code_text}), 400
+
+# 成功响应同样是固定形状，走同一套预序列化模板，省掉 jsonify 的编码开销
+_OK_TPL = b'{"RequestId":"%s","Code":"ok"}'
+
+def _prebuilt_ok(req_id):
+    """用预序列化模板返回 200 成功响应；RequestId 含需转义字符时回退 jsonify"""
+    if _REQ_ID_RE.fullmatch(req_id):
+        return Response(_OK_TPL % req_id.encode('ascii'), status=200, mimetype='application/json')
+    return jsonify({"RequestId": req_id, "Code": "ok"}), 200
+
 @app.route('/api/receive', methods=['POST'])
 def receive_post_data():
-    req_id = request.headers.get('RequestId', str(uuid.uuid4()))
+    req_id = request.headers.get('RequestId') or _fast_uuid()
     response_payload = {"RequestId": req_id}
 
-    if not request.is_json:
-        response_payload["Code"] = "error: Content-Type must be application/json"
-        print(f"[{datetime.datetime.now()}] [ERROR] Content-Type 不是 application/json。")
-        return jsonify(response_payload), 400
+    # request.mimetype 只看已解析的请求头，拒绝错误 Content-Type 时完全不读请求体
+    if request.mimetype != 'application/json':
+        logger.error("Content-Type 不是 application/json。")
+        return _prebuilt_error(_ERR_NOT_JSON_TPL, _ERR_NOT_JSON_CODE, req_id)
 
-    data = request.get_json()
-    if not data:
-        response_payload["Code"] = "error: Invalid JSON payload"
-        print(f"[{datetime.datetime.now()}] [ERROR] 无效的 JSON payload。")
+    # 直接解析请求体，跳过 get_json() 的包装层；cache=False 避免 Werkzeug
+    # 再保留一份请求体副本
+    body = request.get_data(cache=False)
+    try:
+        data = orjson.loads(body) if orjson is not None else json.loads(body)
+    except ValueError:
+        data = None
+    if not data or not isinstance(data, dict):
+        logger.error("无效的 JSON payload。")
+        return _prebuilt_error(_ERR_BAD_PAYLOAD_TPL, _ERR_BAD_PAYLOAD_CODE, req_id)
+
+    missing_fields = _REQUIRED_FIELDS.difference(data)
+    if missing_fields:
+        missing_str = ', '.join(sorted(missing_fields))
+        response_payload["Code"] = f"error: Missing required field(s) '{missing_str}'"
+        logger.error(f"缺少必填字段 '{missing_str}'。Payload: {data}")
         return jsonify(response_payload), 400
-
-    required_fields = ["IdNumber", "Content", "Time", "MessageId", "DeliveryCount", "NetworkMode"]
-    for field in required_fields:
-        if field not in data:
-            response_payload["Code"] = f"error: Missing required field '{field}'"
-            print(f"[{datetime.datetime.now()}] [ERROR] 缺少必填字段 '{field}'。Payload: {data}")
-            return jsonify(response_payload), 400
-        if not isinstance(data[field], str):
-             response_payload["Code"] = f"error: Field '{field}' must be a string"
-             print(f"[{datetime.datetime.now()}] [ERROR] 字段 '{field}' 必须是字符串。Payload: {data}")
-             return jsonify(response_payload), 400
+    # 快路径一次 all() 扫完类型检查；只有校验失败才进慢路径找出是哪个字段
+    if not all(type(data[field]) is str for field in _REQUIRED_FIELDS):
+        for field in _REQUIRED_FIELDS:
+            if not isinstance(data[field], str):
+                response_payload["Code"] = f"error: Field '{field}' must be a string"
+                logger.error(f"字段 '{field}' 必须是字符串。Payload: {data}")
+                return jsonify(response_payload), 400
 
     id_number = data['IdNumber']
     content_hex = data['Content']
-    receive_time = datetime.datetime.now().isoformat(timespec='seconds') # 精确到秒
+    receive_time = time.time_ns() # 展示时再懒格式化
 
-    print(f"[{datetime.datetime.now()}] [INFO] API收到请求 - IdNumber: {id_number}, MessageId: {data['MessageId']}")
+    logger.info(f"API收到请求 - IdNumber: {id_number}, MessageId: {data['MessageId']}")
 
-    parsed_content = parse_hex_content(content_hex)
-    print(f"[{datetime.datetime.now()}] [INFO] 解析结果 (Id:{id_number}, MsgId:{data['MessageId']}): {parsed_content.get('parse_status_text', '未知状态')}")
+    parsed_content = dict(_parse_hex_cached(content_hex))
+    logger.info(f"解析结果 (Id:{id_number}, MsgId:{data['MessageId']}): {parsed_content.get('parse_status_text', '未知状态')}")
     
     message_entry = {
         "raw_post_data": data,
         "parsed_content": parsed_content,
-        "receive_time": receive_time
+        "receive_time": receive_time,
+        "raw_post_pretty": _raw_post_json(data)  # 入库时序列化一次，渲染时直接复用
     }
 
-    if id_number not in DATA_STORE:
-        DATA_STORE[id_number] = []
-    
-    # 始终添加到列表开头，保持最新消息在最前面
-    DATA_STORE[id_number].insert(0, message_entry)
-    
-    save_data()
-    print(f"[{datetime.datetime.now()}] [INFO] 数据已为 IdNumber {id_number} 保存并持久化。")
+    # 始终添加到队列开头，保持最新消息在最前面；appendleft 为 O(1)，
+    # 分片锁只与同分片 ID 的读写互斥
+    with _shard_lock(id_number):
+        DATA_STORE[id_number].appendleft(message_entry)
+
+    append_wal(id_number, message_entry)
+    invalidate_page_cache(id_number)
+    _latest_valid_cache.pop(id_number, None)   # 新消息到达，该 ID 的最新有效定位需要重算
+    logger.info(f"数据已为 IdNumber {id_number} 追加到 WAL。")
+
+    return _prebuilt_ok(req_id)
+
+# 二进制接收接口的元数据请求头（与 JSON 接口的必填字段一一对应）
+_BINARY_META_HEADERS = ('X-IdNumber', 'X-MessageId', 'X-Time', 'X-DeliveryCount', 'X-NetworkMode')
+
+@app.route('/api/receive-binary', methods=['POST'])
+def receive_post_binary():
+    """
+    application/octet-stream 版本的接收接口：电文以原始字节直接上送，
+    元数据放在 X-* 请求头里。相比 JSON 接口省去十六进制字符串的 2 倍
+    传输膨胀和 bytes.fromhex 解码，解析直接走 parse_payload。
+    """
+    req_id = request.headers.get('RequestId') or _fast_uuid()
+    response_payload = {"RequestId": req_id}
+
+    missing_headers = [h for h in _BINARY_META_HEADERS if not request.headers.get(h)]
+    if missing_headers:
+        missing_str = ', '.join(missing_headers)
+        response_payload["Code"] = f"error: Missing required header(s) '{missing_str}'"
+        logger.error(f"缺少必填请求头 '{missing_str}'。")
+        return jsonify(response_payload), 400
+
+    byte_data = request.get_data()
+    if not byte_data:
+        response_payload["Code"] = "error: Empty binary payload"
+        logger.error("二进制请求体为空。")
+        return jsonify(response_payload), 400
+
+    id_number = request.headers['X-IdNumber']
+    receive_time = time.time_ns() # 展示时再懒格式化
+
+    logger.info(f"二进制API收到请求 - IdNumber: {id_number}, MessageId: {request.headers['X-MessageId']}")
+
+    parsed_content = parse_payload(byte_data)
+    logger.info(f"解析结果 (Id:{id_number}, MsgId:{request.headers['X-MessageId']}): {parsed_content.get('parse_status_text', '未知状态')}")
+
+    # 组装与 JSON 接口一致的 raw_post_data，保证存储和页面展示格式统一
+    raw_post_data = {
+        'IdNumber': id_number,
+        'MessageId': request.headers['X-MessageId'],
+        'Content': parsed_content['raw_hex_content'],
+        'Time': request.headers['X-Time'],
+        'DeliveryCount': request.headers['X-DeliveryCount'],
+        'NetworkMode': request.headers['X-NetworkMode'],
+    }
+    message_entry = {
+        "raw_post_data": raw_post_data,
+        "parsed_content": parsed_content,
+        "receive_time": receive_time,
+        "raw_post_pretty": _raw_post_json(raw_post_data)  # 入库时序列化一次，渲染时直接复用
+    }
+
+    with _shard_lock(id_number):
+        DATA_STORE[id_number].appendleft(message_entry)
 
-    response_payload["Code"] = "ok"
-    return jsonify(response_payload), 200
+    append_wal(id_number, message_entry)
+    invalidate_page_cache(id_number)
+    _latest_valid_cache.pop(id_number, None)   # 新消息到达，该 ID 的最新有效定位需要重算
+    logger.info(f"数据已为 IdNumber {id_number} 追加到 WAL。")
+
+    return _prebuilt_ok(req_id)
+
+# 每个 ID 最新一条有效定位的格式化结果缓存：写入时失效，查询时按需重建，
+# 让 /api/latest_locations 的常态是纯字典查找而不是逐条扫描历史
+_latest_valid_cache = {}
+
+def _latest_valid_formatted(id_num):
+    """返回指定 ID 最新一条经纬度有效的消息的格式化结果；没有则返回 None"""
+    if id_num in _latest_valid_cache:
+        return _latest_valid_cache[id_num]
+    # 不存在的 ID 不缓存（也不触碰 defaultdict）：否则任意查询串里的 ID
+    # 会让缓存和 DATA_STORE 无限增长
+    if id_num not in DATA_STORE:
+        return None
+    # 记下计算前的数据版本；扫描期间有新消息写入（版本变化）则放弃缓存
+    # 本次结果，否则会与 POST 侧的失效操作竞态后把过期定位缓存住
+    version = _id_versions[id_num]
+    result = None
+    # 历史已按接收时间倒序排列，从头扫到第一条有效定位即可
+    for msg_entry in _history_snapshot(id_num):
+        formatted_msg = get_formatted_message(msg_entry)
+        if (formatted_msg['decimal_latitude'] is not None and
+            formatted_msg['decimal_longitude'] is not None):
+            result = formatted_msg
+            break
+    with _page_cache_lock:
+        if _id_versions[id_num] == version:
+            _latest_valid_cache[id_num] = result
+    return result
 
 # 修正后的 API 接口：获取所有 ID 的最新有效位置数据
 @app.route('/api/latest_locations', methods=['GET'])
@@ -433,36 +852,13 @@ def api_latest_locations():
         selected_ids = [s.strip() for s in selected_ids_str.split(',') if s.strip()]
     else:
         # 如果没有指定ID，则返回 DATA_STORE 中所有ID的最新数据
-        selected_ids = list(DATA_STORE.keys()) 
+        selected_ids = list(DATA_STORE.keys())
 
     latest_data_for_response = []
 
     for id_num in selected_ids: # 遍历所有**需要查询**的ID
-        messages_for_id = DATA_STORE.get(id_num, [])
-        
-        latest_valid_message_entry = None
-        # DATA_STORE中每个ID的消息列表已按接收时间倒序排列，可以直接遍历
-        for msg_entry in messages_for_id:
-            # 暂时格式化消息以检查经纬度有效性
-            formatted_msg_temp = format_parsed_data_for_display(
-                msg_entry.get('parsed_content', {}),
-                msg_entry.get('raw_post_data', {}),
-                msg_entry.get('receive_time', None)
-            )
-            
-            # 检查 decimal_latitude 和 decimal_longitude 是否有效
-            if (formatted_msg_temp['decimal_latitude'] is not None and 
-                formatted_msg_temp['decimal_longitude'] is not None):
-                latest_valid_message_entry = msg_entry
-                break # 找到第一个有效消息，停止查找
-        
-        if latest_valid_message_entry:
-            # 使用找到的最新有效消息条目进行最终格式化，并包含所有需要显示的信息
-            formatted_final_msg = format_parsed_data_for_display(
-                latest_valid_message_entry.get('parsed_content', {}),
-                latest_valid_message_entry.get('raw_post_data', {}),
-                latest_valid_message_entry.get('receive_time', None)
-            )
+        formatted_final_msg = _latest_valid_formatted(id_num)
+        if formatted_final_msg is not None:
             latest_data_for_response.append({
                 'IdNumber': formatted_final_msg['IdNumber'],
                 'MessageId': formatted_final_msg['MessageId'],
@@ -477,15 +873,66 @@ def api_latest_locations():
                 # 可以根据需要添加更多字段
             })
     
-    print(f"[{datetime.datetime.now()}] [INFO] 准备返回 {len(latest_data_for_response)} 条最新有效位置数据 (过滤ID: {', '.join(selected_ids) if selected_ids else '所有ID'})。")
+    logger.info(f"准备返回 {len(latest_data_for_response)} 条最新有效位置数据 (过滤ID: {', '.join(selected_ids) if selected_ids else '所有ID'})。")
     return jsonify(latest_data_for_response)
 
 
 # --- Web 路由 ---
+
+# 页面渲染结果缓存：'/' 和 '/map' 在两次写入之间输出完全相同，POST 时整体失效，
+# 读多写少的场景下把多次 GET 的渲染开销摊薄成一次
+_page_cache = {}
+_page_cache_lock = threading.Lock()
+
+# 数据版本号：全局一个、每个 ID 一个，写入时递增。页面响应以版本号作为 ETag，
+# 客户端带 If-None-Match 重访且数据未变时直接返回 304，连缓存页都不用发。
+# 版本号每次进程启动都从 0 开始，ETag 里拼上启动时刻的纳秒时间戳，
+# 避免重启后新进程的 "vN" 与旧进程的同名 ETag 撞车导致错误 304
+_BOOT_NS = time.time_ns()
+_data_version = 0
+_id_versions = defaultdict(int)
+
+def invalidate_page_cache(id_number=None):
+    """数据发生写入后使整页缓存失效，并递增对应的数据版本号"""
+    global _data_version
+    # 递增不是原子操作，多线程并发 POST 时可能丢失一次递增，
+    # 导致客户端拿着旧 ETag 一直收到 304，所以和缓存清理一起放在锁内
+    with _page_cache_lock:
+        _page_cache.clear()
+        _data_version += 1
+        if id_number is not None:
+            _id_versions[id_number] += 1
+
+def _not_modified_or(etag, make_response):
+    """客户端 ETag 仍然有效时返回 304，否则构造完整响应并打上 ETag"""
+    if etag in request.if_none_match:
+        return Response(status=304)
+    resp = make_response()
+    resp.set_etag(etag)
+    return resp
+
+def _cached_page(name, render_func):
+    """按页面名取缓存的渲染结果，未命中时在锁内渲染一次"""
+    page = _page_cache.get(name)
+    if page is not None:
+        return page
+    with _page_cache_lock:
+        page = _page_cache.get(name)
+        if page is None:
+            page = render_func()
+            _page_cache[name] = page
+        return page
+
 @app.route('/')
 def index():
-    print(f"[{datetime.datetime.now()}] [INFO] 访问主页 '/'。")
-    
+    logger.info("访问主页 '/'。")
+    return _not_modified_or(
+        f'v{_BOOT_NS}-{_data_version}',
+        lambda: Response(_cached_page('index', _render_index_page), mimetype='text/html'),
+    )
+
+def _render_index_page():
+    """渲染主页 HTML，结果由 index() 缓存"""
     # 准备所有 ID 的所有消息，并进行格式化
     all_messages_for_frontend = {} # 格式: { "ID1": [formatted_msg1, formatted_msg2, ...], "ID2": [...] }
     sorted_id_numbers = sorted(DATA_STORE.keys()) # 保持 ID 排序
@@ -496,12 +943,8 @@ def index():
     for id_num in sorted_id_numbers: # 确保ID有序
         messages_for_id = []
         if id_num in DATA_STORE:
-            for msg_entry in DATA_STORE[id_num]:
-                formatted_msg = format_parsed_data_for_display(
-                    msg_entry.get('parsed_content', {}),
-                    msg_entry.get('raw_post_data', {}),
-                    msg_entry.get('receive_time', None)
-                )
+            for msg_entry in _history_snapshot(id_num):
+                formatted_msg = get_formatted_message(msg_entry)
                 messages_for_id.append(formatted_msg)
             
             if messages_for_id: # 只添加有消息的ID
@@ -513,7 +956,7 @@ def index():
     final_sorted_id_numbers_with_messages = sorted(all_messages_for_frontend.keys())
 
 
-    print(f"[{datetime.datetime.now()}] [INFO] 主页准备向前端发送所有 {total_unique_ids} 个 ID 的 {total_all_messages_count} 条消息。")
+    logger.info(f"主页准备向前端发送所有 {total_unique_ids} 个 ID 的 {total_all_messages_count} 条消息。")
     return render_template(
         'index.html',
         # 将所有 ID 的所有消息传递给前端，前端 JS 会根据搜索条件进行过滤和渲染
@@ -526,40 +969,53 @@ def index():
 
 @app.route('/history/<string:id_number_param>')
 def history(id_number_param):
-    print(f"[{datetime.datetime.now()}] [INFO] 访问历史页面 '/history/{id_number_param}'。")
+    logger.info(f"访问历史页面 '/history/{id_number_param}'。")
     id_number = id_number_param
 
-    if id_number not in DATA_STORE or not DATA_STORE[id_number]:
-        print(f"[{datetime.datetime.now()}] [WARN] 未找到 ID '{id_number}' 的历史数据。")
+    historical_messages_raw = _history_snapshot(id_number)
+    if not historical_messages_raw:
+        logger.warning(f"未找到 ID '{id_number}' 的历史数据。")
         return render_template('not_found.html', id_number=id_number), 404
 
-    historical_messages_raw = DATA_STORE[id_number]
-    
+    # 该 ID 自上次访问以来没有新数据时直接 304，整页渲染全部跳过
+    etag = f'v{_BOOT_NS}-{_id_versions[id_number]}'
+    if etag in request.if_none_match:
+        return Response(status=304)
+
     historical_messages_formatted = []
     for msg_entry in historical_messages_raw:
-        formatted_msg = format_parsed_data_for_display(
-            msg_entry.get('parsed_content', {}),
-            msg_entry.get('raw_post_data', {}),
-            msg_entry.get('receive_time', None)
-        )
+        formatted_msg = get_formatted_message(msg_entry)
         # raw_post_data_json 已经在 format_parsed_data_for_display 中添加
         historical_messages_formatted.append(formatted_msg)
 
     # 从URL查询参数中获取搜索关键词
     query = request.args.get('query', '') 
 
-    print(f"[{datetime.datetime.now()}] [INFO] ID '{id_number_param}' 历史页面已加载，包含 {len(historical_messages_formatted)} 条消息。")
-    return render_template(
-        'history.html',
-        id_number=id_number,
-        historical_messages=historical_messages_formatted, # 传递已经格式化好的消息列表
-        initial_query=query # 传递搜索关键词给前端
+    logger.info(f"ID '{id_number_param}' 历史页面已加载，包含 {len(historical_messages_formatted)} 条消息。")
+    # 流式渲染：template.generate() 逐块产出 HTML，避免 render_template 把整页
+    # 拼成一个大字符串，历史消息很多时可降低峰值内存并提前首字节
+    template = app.jinja_env.get_template('history.html')
+    resp = Response(
+        stream_with_context(template.generate(
+            id_number=id_number,
+            historical_messages=historical_messages_formatted, # 传递已经格式化好的消息列表
+            initial_query=query # 传递搜索关键词给前端
+        )),
+        mimetype='text/html'
     )
+    resp.set_etag(etag)
+    return resp
 
 @app.route('/map')
 def map_page():
-    print(f"[{datetime.datetime.now()}] [INFO] 访问地图页面 '/map'。")
-    
+    logger.info("访问地图页面 '/map'。")
+    return _not_modified_or(
+        f'v{_BOOT_NS}-{_data_version}',
+        lambda: Response(_cached_page('map', _render_map_page), mimetype='text/html'),
+    )
+
+def _render_map_page():
+    """渲染地图页 HTML，结果由 map_page() 缓存"""
     # 与 index 路由类似，准备所有 ID 的所有消息
     all_messages_for_frontend = {} 
     sorted_id_numbers = sorted(DATA_STORE.keys())
@@ -567,12 +1023,8 @@ def map_page():
     for id_num in sorted_id_numbers:
         messages_for_id = []
         if id_num in DATA_STORE:
-            for msg_entry in DATA_STORE[id_num]:
-                formatted_msg = format_parsed_data_for_display(
-                    msg_entry.get('parsed_content', {}),
-                    msg_entry.get('raw_post_data', {}),
-                    msg_entry.get('receive_time', None)
-                )
+            for msg_entry in _history_snapshot(id_num):
+                formatted_msg = get_formatted_message(msg_entry)
                 messages_for_id.append(formatted_msg)
             
             if messages_for_id:
@@ -590,12 +1042,19 @@ def map_page():
 
 @app.errorhandler(404)
 def page_not_found(e):
-    print(f"[{datetime.datetime.now()}] [WARN] 发生 404 错误: {request.path}")
+    logger.warning(f"发生 404 错误: {request.path}")
     return render_template('not_found.html'), 404
 
 # --- 应用启动 ---
 if __name__ == '__main__':
-    load_data()
-    print(f"[{datetime.datetime.now()}] [INFO] Flask 应用启动中...")
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # debug=True 会启用重载器和调试器，仅在显式设置 FLASK_DEV 时打开；
+    # 生产部署请使用 run-http-server.sh（gunicorn 单 worker 多线程，见 wsgi.py）
+    dev_mode = os.environ.get('FLASK_DEV') == '1'
+    # 重载器模式下监控进程只负责拉起/重启子进程，不处理请求；持久化
+    # （WAL 句柄与压缩线程）只能在真正服务请求的子进程里初始化，否则
+    # 监控进程会周期性用启动时的旧数据覆盖快照、清掉子进程的 WAL
+    if not dev_mode or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        init_persistence()
+    logger.info(f"Flask 应用启动中... (debug={dev_mode})")
+    app.run(host='0.0.0.0', port=5000, debug=dev_mode, threaded=True)
 
@@ -1,19 +1,21 @@
 #!/bin/bash
 
-# 定义要杀死的进程名
-PROCESS_NAME="http_server3.py"
+# 定义要杀死的进程匹配模式
+# run-http-server.sh 优先以 gunicorn ... wsgi:app 启动，未装 gunicorn 时
+# 回退为 python3 http_server3.py，两种命令行都要能匹配到
+PROCESS_PATTERN="http_server3.py|gunicorn.*wsgi:app"
 
-echo "尝试杀死进程: ${PROCESS_NAME}"
+echo "尝试杀死进程: ${PROCESS_PATTERN}"
 
 # 使用 ps aux 查找所有进程
-# 通过 grep 过滤出包含 PROCESS_NAME 的行
+# 通过 grep -E 过滤出匹配 PROCESS_PATTERN 的行
 # 使用 grep -v grep 排除 grep 命令本身的进程
 # 使用 awk '{print $2}' 提取进程ID (PID，通常是第二列)
-PIDS=$(ps aux | grep "${PROCESS_NAME}" | grep -v grep | awk '{print $2}')
+PIDS=$(ps aux | grep -E "${PROCESS_PATTERN}" | grep -v grep | awk '{print $2}')
 
 # 检查是否找到了PID
 if [ -z "$PIDS" ]; then
-  echo "未找到进程 '${PROCESS_NAME}'。"
+  echo "未找到进程 '${PROCESS_PATTERN}'。"
 else
   echo "找到进程ID: ${PIDS}"
   echo "正在杀死进程..."
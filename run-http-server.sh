@@ -1,12 +1,17 @@
 #!/bin/bash
 
 # 后台运行 HTTP 服务器
-nohup python3 http_server3.py > http_server3.log 2>&1 &
+# 优先使用 gunicorn（单 worker + 多线程，内存态 DATA_STORE 不支持多进程），
+# 未安装 gunicorn 时回退到 Flask 自带的开发服务器
+if command -v gunicorn >/dev/null 2>&1; then
+  nohup gunicorn -w 1 --threads 8 -b 0.0.0.0:5000 wsgi:app > http_server3.log 2>&1 &
+else
+  nohup python3 http_server3.py > http_server3.log 2>&1 &
+fi
 
 # 数据保存在 data_store.json 中
 
 # 查看日志
-# tail -f http_server3.log 
-
+# tail -f http_server3.log
 
 
@@ -0,0 +1,10 @@
+"""Gunicorn/WSGI 生产环境入口。
+
+DATA_STORE 是进程内存态的，多 worker 进程会各自持有一份数据，
+所以只能单 worker + 多线程运行（WAL 改造后写路径很轻，线程足够）：
+
+    gunicorn -w 1 --threads 8 -b 0.0.0.0:5000 wsgi:app
+"""
+from http_server3 import app, init_persistence
+
+init_persistence()